@@ -1,9 +1,15 @@
 """Cekat Docs RAG System using Supabase with pgvector for semantic search."""
 
+import asyncio
 import os
 import logging
 import hashlib
-from typing import List, Dict, Any, Optional
+import math
+import operator
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, cast
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -17,6 +23,87 @@ from openai import OpenAI
 logging.basicConfig(level=logging.WARNING)
 logger = logging.getLogger(__name__)
 
+# Semantic cache: reuse results of an earlier query whose embedding is this similar
+SEMANTIC_CACHE_THRESHOLD = 0.92
+SEMANTIC_CACHE_TTL = 300.0  # seconds
+# Lookups are a pure-Python linear cosine scan (~50us per entry at 1536 dims),
+# so keep this small: 64 entries is ~3ms per miss
+SEMANTIC_CACHE_SIZE = 64
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_CACHE_SIZE = 2048
+
+# Concurrent embed requests are collected for this long (or until the batch is full)
+EMBEDDING_BATCH_WINDOW = 0.01  # seconds
+EMBEDDING_BATCH_SIZE = 32
+
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive form of a query, used for cache keys."""
+    return " ".join(query.lower().split())
+
+
+class SemanticQueryCache:
+    """Small LRU of query embeddings to search results, matched by cosine similarity."""
+
+    def __init__(self, max_size: int = SEMANTIC_CACHE_SIZE,
+                 threshold: float = SEMANTIC_CACHE_THRESHOLD,
+                 ttl: float = SEMANTIC_CACHE_TTL):
+        self.max_size = max_size
+        self.threshold = threshold
+        self.ttl = ttl
+        # key -> (unit embedding, limit, stored_at, results)
+        self._entries: OrderedDict[int, tuple[List[float], int, float, List[Dict[str, Any]]]] = OrderedDict()
+        self._next_key = 0
+        # search_docs runs in worker threads, so guard the shared entries
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> List[float]:
+        norm = math.sqrt(sum(map(operator.mul, embedding, embedding)))
+        if not norm:
+            return list(embedding)
+        return [value / norm for value in embedding]
+
+    def get(self, embedding: List[float], limit: int) -> Optional[List[Dict[str, Any]]]:
+        """Return cached results for the most similar fresh query, if close enough."""
+        query = self._normalize(embedding)
+        now = time.monotonic()
+        with self._lock:
+            expired = [
+                key for key, (_, _, stored_at, _) in self._entries.items()
+                if now - stored_at > self.ttl
+            ]
+            for key in expired:
+                del self._entries[key]
+            candidates = [
+                (key, cached, results)
+                for key, (cached, cached_limit, _, results) in self._entries.items()
+                if cached_limit == limit
+            ]
+        
+        # Scan a snapshot outside the lock so concurrent lookups/puts are not serialized
+        best_key, best_sim, best_results = None, self.threshold, None
+        for key, cached, results in candidates:
+            sim = sum(map(operator.mul, query, cached))
+            if sim >= best_sim:
+                best_key, best_sim, best_results = key, sim, results
+        if best_key is None:
+            return None
+        with self._lock:
+            if best_key in self._entries:
+                self._entries.move_to_end(best_key)
+        return best_results
+
+    def put(self, embedding: List[float], limit: int, results: List[Dict[str, Any]]) -> None:
+        entry = (self._normalize(embedding), limit, time.monotonic(), results)
+        with self._lock:
+            self._entries[self._next_key] = entry
+            self._next_key += 1
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
 class CekatDocsRAG:
     """RAG system for retrieving Cekat documentation using Supabase pgvector."""
     
@@ -27,8 +114,15 @@ class CekatDocsRAG:
         self.supabase_key = os.getenv("SUPABASE_ANON_KEY")
         
         # Initialize query cache for faster response
-        self.query_cache = {}
-        self.max_cache_size = 100  # Limit cache to prevent memory issues
+        # Exact-match result cache keyed by normalized query + limit, in LRU order
+        self.query_cache: OrderedDict[str, List[Dict[str, Any]]] = OrderedDict()
+        self.max_cache_size = 256  # Limit cache to prevent memory issues
+        self._query_cache_lock = threading.Lock()
+        # Catches rephrasings of recent queries that miss the exact-match cache
+        self.semantic_cache = SemanticQueryCache()
+        # Query embeddings keyed by sha256 of the normalized query, in LRU order
+        self.embedding_cache: OrderedDict[str, List[float]] = OrderedDict()
+        self._embedding_lock = threading.Lock()
         
         # Check if Supabase is configured
         if not self.supabase_url or not self.supabase_key:
@@ -69,9 +163,71 @@ class CekatDocsRAG:
         
         # Initialized silently for performance
     
+    def _cache_result(self, query_hash: str, results: List[Dict[str, Any]]) -> None:
+        """Store results in the exact-match cache, evicting the least recently used entry."""
+        with self._query_cache_lock:
+            self.query_cache[query_hash] = results
+            self.query_cache.move_to_end(query_hash)
+            if len(self.query_cache) > self.max_cache_size:
+                self.query_cache.popitem(last=False)
+    
+    @staticmethod
+    def _embedding_key(query: str) -> str:
+        return hashlib.sha256(normalize_query(query).encode()).hexdigest()
+    
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embed queries, reusing cached vectors and batching the misses into one API call."""
+        keys = [self._embedding_key(query) for query in queries]
+        embeddings: List[Optional[List[float]]] = []
+        missing: Dict[str, str] = {}
+        with self._embedding_lock:
+            for key, query in zip(keys, queries):
+                cached = self.embedding_cache.get(key)
+                if cached is not None:
+                    self.embedding_cache.move_to_end(key)
+                else:
+                    missing.setdefault(key, query)
+                embeddings.append(cached)
+        
+        if missing:
+            response = self.openai_client.embeddings.create(
+                model=EMBEDDING_MODEL,
+                input=list(missing.values())
+            )
+            fresh = dict(zip(missing, (item.embedding for item in response.data)))
+            with self._embedding_lock:
+                for key, embedding in fresh.items():
+                    self.embedding_cache[key] = embedding
+                while len(self.embedding_cache) > EMBEDDING_CACHE_SIZE:
+                    self.embedding_cache.popitem(last=False)
+            embeddings = [
+                embedding if embedding is not None else fresh[key]
+                for key, embedding in zip(keys, embeddings)
+            ]
+        
+        return embeddings  # type: ignore[return-value]
+    
+    def embed_query(self, query: str) -> List[float]:
+        """Embed a single query (cached)."""
+        return self.embed_queries([query])[0]
+    
+    def cached_embedding(self, query: str) -> Optional[List[float]]:
+        """Return the cached embedding for a query without calling the API."""
+        with self._embedding_lock:
+            return self.embedding_cache.get(self._embedding_key(query))
     
-    def search_docs(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
-        """Search for relevant Cekat documentation using vector similarity with caching."""
+    @property
+    def is_configured(self) -> bool:
+        """Whether both the OpenAI and Supabase clients are available."""
+        return bool(self.openai_client and self.supabase)
+    
+    def search_docs(self, query: str, limit: int = 10,
+                    embedding: Optional[List[float]] = None) -> List[Dict[str, Any]]:
+        """Search for relevant Cekat documentation using vector similarity with caching.
+        
+        Pass ``embedding`` when the query vector was already computed (e.g. by
+        EmbeddingBatcher) to skip the embedding step.
+        """
         try:
             # Check if clients are available
             if not self.openai_client:
@@ -83,21 +239,24 @@ class CekatDocsRAG:
                 return []
             
             # Generate cache key from query
-            query_normalized = query.lower().strip()
-            query_hash = hashlib.md5(f"{query_normalized}_{limit}".encode()).hexdigest()
+            query_hash = hashlib.md5(f"{normalize_query(query)}_{limit}".encode()).hexdigest()
             
             # Check cache first
-            if query_hash in self.query_cache:
-                # Cache hit - return silently
-                return self.query_cache[query_hash]
+            with self._query_cache_lock:
+                hit = self.query_cache.get(query_hash)
+                if hit is not None:
+                    # Cache hit - return silently
+                    self.query_cache.move_to_end(query_hash)
+                    return hit
             
             # Generate embedding for query using small model
-            response = self.openai_client.embeddings.create(
-                model="text-embedding-3-small",
-                input=query
-            )
+            query_embedding = embedding if embedding is not None else self.embed_query(query)
             
-            query_embedding = response.data[0].embedding
+            # Near-duplicate of a recent query: skip the pgvector round trip
+            cached = self.semantic_cache.get(query_embedding, limit)
+            if cached is not None:
+                self._cache_result(query_hash, cached)
+                return cached
             
             # Search using Supabase RPC function - default to 5 for faster response
             result = self.supabase.rpc('match_documents', {
@@ -111,12 +270,10 @@ class CekatDocsRAG:
                 pass
                 
                 # Cache the results
-                if len(self.query_cache) >= self.max_cache_size:
-                    # Remove oldest entry (simple FIFO)
-                    self.query_cache.pop(next(iter(self.query_cache)))
-                
-                self.query_cache[query_hash] = result.data
-                return result.data
+                docs = cast(List[Dict[str, Any]], result.data)
+                self._cache_result(query_hash, docs)
+                self.semantic_cache.put(query_embedding, limit, docs)
+                return docs
             else:
                 # No documents found silently
                 return []
@@ -127,6 +284,58 @@ class CekatDocsRAG:
     
 
 
+class EmbeddingBatcher:
+    """Coalesce concurrent query embeddings into batched embed_queries calls."""
+    
+    def __init__(self, rag: CekatDocsRAG, window: float = EMBEDDING_BATCH_WINDOW,
+                 max_batch: int = EMBEDDING_BATCH_SIZE):
+        self.rag = rag
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: List[tuple[str, asyncio.Future[List[float]]]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._tasks: set[asyncio.Task[None]] = set()
+    
+    async def embed(self, query: str) -> List[float]:
+        """Embed one query, sharing an API call with others arriving in the same window."""
+        cached = self.rag.cached_embedding(query)
+        if cached is not None:
+            return cached
+        
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[List[float]] = loop.create_future()
+        self._pending.append((query, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window, self._flush)
+        return await future
+    
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+    
+    async def _run(self, batch: List[tuple[str, asyncio.Future[List[float]]]]) -> None:
+        try:
+            embeddings = await asyncio.to_thread(
+                self.rag.embed_queries, [query for query, _ in batch]
+            )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), embedding in zip(batch, embeddings):
+            if not future.done():
+                future.set_result(embedding)
+
+
 # Global instance
 cekat_docs_rag = CekatDocsRAG()
 
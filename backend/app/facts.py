@@ -53,6 +53,14 @@ class FactStore:
             self._order.append(fact.id)
             return fact
 
+    async def create_saved(self, *, text: str) -> Fact:
+        """Create a fact that is already marked as saved and return it."""
+        async with self._lock:
+            fact = Fact(text=text, status=FactStatus.SAVED)
+            self._facts[fact.id] = fact
+            self._order.append(fact.id)
+            return fact
+
     async def mark_saved(self, fact_id: str) -> Fact | None:
         """Mark the given fact as saved, returning the updated record."""
         async with self._lock:
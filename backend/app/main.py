@@ -3,10 +3,12 @@
 from __future__ import annotations
 
 from typing import Any
+import asyncio
 import os
+from contextlib import asynccontextmanager
 
 # Disable OpenAI tracing for performance - MUST be before any imports
-os.environ['OPENAI_TRACING_DISABLED'] = 'true'
+os.environ['OPENAI_AGENTS_DISABLE_TRACING'] = 'true'
 os.environ['OTEL_SDK_DISABLED'] = 'true'
 import uuid
 import hashlib
@@ -31,6 +33,7 @@ from .server import (
     create_chatkit_server,
 )
 from .facts import fact_store
+from .tools import close_shared_clients, wait_for_background_tasks
 from .s3_client import get_cekat_s3_client
 
 class S3AttachmentStore(AttachmentStore):
@@ -50,6 +53,25 @@ class S3AttachmentStore(AttachmentStore):
         """Get S3 key for attachment ID."""
         return f"attachments/{attachment_id}"
     
+    def _download_bytes(self, s3_key: str) -> bytes:
+        """Download S3 object to a temporary file and return its bytes (blocking)."""
+        import tempfile
+        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
+            try:
+                result = self.s3_client.download_file(s3_key, temp_file.name)
+                if not result["success"]:
+                    raise HTTPException(
+                        status_code=404,
+                        detail=f"Failed to download from S3: {result['error']}"
+                    )
+                
+                # Read the downloaded file
+                with open(temp_file.name, "rb") as f:
+                    return f.read()
+            finally:
+                # Clean up temp file
+                os.unlink(temp_file.name)
+    
     async def create_attachment(self, input: AttachmentCreateParams, context: Any) -> Attachment:
         """Create attachment metadata and return upload URL."""
         try:
@@ -64,8 +86,8 @@ class S3AttachmentStore(AttachmentStore):
                     name=input.name or "image",
                     mime_type=input.mime_type,
                     size=input.size,
-                    url=f"https://{self.s3_client.bucket_name}.s3.{self.s3_client.region}.amazonaws.com/{s3_key}",
-                    preview_url=f"https://{self.s3_client.bucket_name}.s3.{self.s3_client.region}.amazonaws.com/{s3_key}"
+                    url=self.s3_client.get_file_url(s3_key),
+                    preview_url=self.s3_client.get_file_url(s3_key)
                 )
             else:
                 attachment = FileAttachment(
@@ -109,7 +131,7 @@ class S3AttachmentStore(AttachmentStore):
             metadata = self.metadata_store[attachment_id]
             s3_key = metadata.get("s3_key")
             if s3_key:
-                result = self.s3_client.delete_file(s3_key)
+                result = await asyncio.to_thread(self.s3_client.delete_file, s3_key)
                 if not result["success"]:
                     print(f"Warning: Failed to delete S3 file {s3_key}: {result['error']}")
             
@@ -141,25 +163,8 @@ class S3AttachmentStore(AttachmentStore):
                     detail="S3 key not found for attachment"
                 )
             
-            # Download file from S3 to temporary location
-            import tempfile
-            with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-                result = self.s3_client.download_file(s3_key, temp_file.name)
-                if not result["success"]:
-                    raise HTTPException(
-                        status_code=404,
-                        detail=f"Failed to download from S3: {result['error']}"
-                    )
-                
-                # Read the downloaded file
-                with open(temp_file.name, "rb") as f:
-                    content = f.read()
-                
-                # Clean up temp file
-                import os
-                os.unlink(temp_file.name)
-                
-                return content
+            # Download and read in a worker thread so the event loop is not blocked
+            return await asyncio.to_thread(self._download_bytes, s3_key)
                 
         except HTTPException:
             raise
@@ -169,7 +174,15 @@ class S3AttachmentStore(AttachmentStore):
                 detail=f"Failed to read attachment bytes: {str(e)}"
             )
 
-app = FastAPI(title="ChatKit API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Let in-flight background S3 uploads finish before tearing down clients
+    await wait_for_background_tasks()
+    # Release pooled connections held by the tool HTTP/OpenAI clients
+    await close_shared_clients()
+
+app = FastAPI(title="ChatKit API", lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -447,8 +460,8 @@ async def chatkit_files_upload(request: Request) -> dict[str, Any]:
         s3_key = attachment_store._get_s3_key(attachment_id)
         import io
         file_obj = io.BytesIO(content)
-        upload_result = attachment_store.s3_client.upload_fileobj(
-            file_obj, s3_key, content_type
+        upload_result = await asyncio.to_thread(
+            attachment_store.s3_client.upload_fileobj, file_obj, s3_key, content_type
         )
         
         if not upload_result["success"]:
@@ -1,8 +1,12 @@
 """AWS S3 utility for Cekat AI platform."""
 
 import os
+import time
 import boto3
-from typing import Optional, Dict, Any
+from boto3.exceptions import S3UploadFailedError
+from botocore.exceptions import ClientError
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Iterator, List
 from dotenv import load_dotenv
 import logging
 
@@ -11,6 +15,26 @@ load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# S3 DeleteObjects accepts at most 1000 keys per request
+DELETE_BATCH_SIZE = 1000
+
+# Presigned URL cache: max entries and how long before expiry a URL is re-signed
+PRESIGNED_URL_CACHE_SIZE = 1024
+PRESIGNED_URL_REFRESH_MARGIN = 60
+
+def _error_code(error: Exception) -> str:
+    """Extract the S3 error code from a botocore/boto3 error."""
+    if not isinstance(error, ClientError):
+        # boto3 raises S3UploadFailedError inside `except ClientError` without
+        # `from`, so the original error is usually only on __context__
+        cause = error.__cause__ or error.__context__
+        if isinstance(cause, ClientError):
+            error = cause
+    if isinstance(error, ClientError):
+        return error.response.get('Error', {}).get('Code', 'Unknown')
+    return type(error).__name__
+
+
 class CekatS3Client:
     """S3 client for Cekat AI platform operations."""
     
@@ -20,6 +44,9 @@ class CekatS3Client:
         self.aws_secret_key = os.getenv('AWS_S3_SECRET_ACCESS_KEY')
         self.bucket_name = os.getenv('AWS_S3_BUCKET_NAME', 'cekat-ai')
         self.region = os.getenv('AWS_S3_BUCKET_REGION', 'us-east-2')
+        self._url_prefix = f"https://{self.bucket_name}.s3.{self.region}.amazonaws.com/"
+        # (s3_key, expiration) -> (expires_at, url)
+        self._presigned_url_cache: OrderedDict[tuple[str, int], tuple[float, str]] = OrderedDict()
         
         if not self.aws_access_key or not self.aws_secret_key:
             logger.warning("AWS credentials not found in environment variables")
@@ -33,11 +60,15 @@ class CekatS3Client:
                 aws_secret_access_key=self.aws_secret_key,
                 region_name=self.region
             )
-            logger.info(f"S3 client initialized for bucket: {self.bucket_name}")
+            logger.info("S3 client initialized for bucket: %s", self.bucket_name)
         except Exception as e:
-            logger.error(f"Failed to initialize S3 client: {e}")
+            logger.error("Failed to initialize S3 client: %s", e)
             self.s3_client = None
     
+    def get_file_url(self, s3_key: str) -> str:
+        """Get the public URL for an S3 key."""
+        return self._url_prefix + s3_key
+    
     def upload_file(self, file_path: str, s3_key: str, content_type: Optional[str] = None) -> Dict[str, Any]:
         """Upload file to S3 bucket."""
         if not self.s3_client:
@@ -55,8 +86,8 @@ class CekatS3Client:
                 ExtraArgs=extra_args
             )
             
-            url = f"https://{self.bucket_name}.s3.{self.region}.amazonaws.com/{s3_key}"
-            logger.info(f"File uploaded successfully: {s3_key}")
+            url = self._url_prefix + s3_key
+            logger.debug("File uploaded successfully: %s", s3_key)
             
             return {
                 "success": True,
@@ -65,9 +96,10 @@ class CekatS3Client:
                 "key": s3_key
             }
             
-        except Exception as e:
-            logger.error(f"Failed to upload file {s3_key}: {e}")
-            return {"success": False, "error": str(e)}
+        except (ClientError, S3UploadFailedError) as e:
+            code = _error_code(e)
+            logger.error("Failed to upload file %s: %s", s3_key, code)
+            return {"success": False, "error": code}
     
     def upload_fileobj(self, file_obj, s3_key: str, content_type: Optional[str] = None) -> Dict[str, Any]:
         """Upload file object to S3 bucket."""
@@ -86,8 +118,8 @@ class CekatS3Client:
                 ExtraArgs=extra_args
             )
             
-            url = f"https://{self.bucket_name}.s3.{self.region}.amazonaws.com/{s3_key}"
-            logger.info(f"File object uploaded successfully: {s3_key}")
+            url = self._url_prefix + s3_key
+            logger.debug("File object uploaded successfully: %s", s3_key)
             
             return {
                 "success": True,
@@ -96,9 +128,10 @@ class CekatS3Client:
                 "key": s3_key
             }
             
-        except Exception as e:
-            logger.error(f"Failed to upload file object {s3_key}: {e}")
-            return {"success": False, "error": str(e)}
+        except (ClientError, S3UploadFailedError) as e:
+            code = _error_code(e)
+            logger.error("Failed to upload file object %s: %s", s3_key, code)
+            return {"success": False, "error": code}
     
     def download_file(self, s3_key: str, local_path: str) -> Dict[str, Any]:
         """Download file from S3 bucket."""
@@ -107,7 +140,7 @@ class CekatS3Client:
         
         try:
             self.s3_client.download_file(self.bucket_name, s3_key, local_path)
-            logger.info(f"File downloaded successfully: {s3_key}")
+            logger.debug("File downloaded successfully: %s", s3_key)
             
             return {
                 "success": True,
@@ -116,9 +149,10 @@ class CekatS3Client:
                 "key": s3_key
             }
             
-        except Exception as e:
-            logger.error(f"Failed to download file {s3_key}: {e}")
-            return {"success": False, "error": str(e)}
+        except ClientError as e:
+            code = _error_code(e)
+            logger.error("Failed to download file %s: %s", s3_key, code)
+            return {"success": False, "error": code}
     
     def delete_file(self, s3_key: str) -> Dict[str, Any]:
         """Delete file from S3 bucket."""
@@ -127,7 +161,7 @@ class CekatS3Client:
         
         try:
             self.s3_client.delete_object(Bucket=self.bucket_name, Key=s3_key)
-            logger.info(f"File deleted successfully: {s3_key}")
+            logger.debug("File deleted successfully: %s", s3_key)
             
             return {
                 "success": True,
@@ -135,9 +169,64 @@ class CekatS3Client:
                 "key": s3_key
             }
             
-        except Exception as e:
-            logger.error(f"Failed to delete file {s3_key}: {e}")
-            return {"success": False, "error": str(e)}
+        except ClientError as e:
+            code = _error_code(e)
+            logger.error("Failed to delete file %s: %s", s3_key, code)
+            return {"success": False, "error": code}
+    
+    def delete_files(self, s3_keys: List[str]) -> Dict[str, Any]:
+        """Delete multiple files from S3 bucket in batches of up to 1000 keys."""
+        if not self.s3_client:
+            return {"success": False, "error": "S3 client not initialized"}
+        
+        try:
+            errors = []
+            for i in range(0, len(s3_keys), DELETE_BATCH_SIZE):
+                response = self.s3_client.delete_objects(
+                    Bucket=self.bucket_name,
+                    Delete={
+                        'Objects': [{'Key': key} for key in s3_keys[i:i + DELETE_BATCH_SIZE]],
+                        'Quiet': True
+                    }
+                )
+                errors.extend(response.get('Errors', ()))
+            
+            if errors:
+                logger.error("Failed to delete %d of %d files", len(errors), len(s3_keys))
+                return {
+                    "success": False,
+                    "error": f"Failed to delete {len(errors)} files",
+                    "failed_keys": [err.get('Key') for err in errors],
+                    "bucket": self.bucket_name
+                }
+            
+            logger.debug("Files deleted successfully: %d", len(s3_keys))
+            
+            return {
+                "success": True,
+                "bucket": self.bucket_name,
+                "count": len(s3_keys)
+            }
+            
+        except ClientError as e:
+            code = _error_code(e)
+            logger.error("Failed to delete %d files: %s", len(s3_keys), code)
+            return {"success": False, "error": code}
+    
+    def iter_files(self, prefix: str = "") -> Iterator[Dict[str, Any]]:
+        """Yield files in S3 bucket with optional prefix, one page at a time."""
+        if not self.s3_client:
+            return
+        
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix):
+            for obj in page.get('Contents', ()):
+                yield {
+                    "key": obj['Key'],
+                    "size": obj['Size'],
+                    "last_modified": obj['LastModified'].isoformat(),
+                    "url": self._url_prefix + obj['Key']
+                }
     
     def list_files(self, prefix: str = "") -> Dict[str, Any]:
         """List files in S3 bucket with optional prefix."""
@@ -145,20 +234,7 @@ class CekatS3Client:
             return {"success": False, "error": "S3 client not initialized"}
         
         try:
-            response = self.s3_client.list_objects_v2(
-                Bucket=self.bucket_name,
-                Prefix=prefix
-            )
-            
-            files = []
-            if 'Contents' in response:
-                for obj in response['Contents']:
-                    files.append({
-                        "key": obj['Key'],
-                        "size": obj['Size'],
-                        "last_modified": obj['LastModified'].isoformat(),
-                        "url": f"https://{self.bucket_name}.s3.{self.region}.amazonaws.com/{obj['Key']}"
-                    })
+            files = list(self.iter_files(prefix))
             
             return {
                 "success": True,
@@ -166,15 +242,27 @@ class CekatS3Client:
                 "count": len(files)
             }
             
-        except Exception as e:
-            logger.error(f"Failed to list files with prefix {prefix}: {e}")
-            return {"success": False, "error": str(e)}
+        except ClientError as e:
+            code = _error_code(e)
+            logger.error("Failed to list files with prefix %s: %s", prefix, code)
+            return {"success": False, "error": code}
     
     def generate_presigned_url(self, s3_key: str, expiration: int = 3600) -> Dict[str, Any]:
         """Generate presigned URL for file access."""
         if not self.s3_client:
             return {"success": False, "error": "S3 client not initialized"}
         
+        cache_key = (s3_key, expiration)
+        now = time.monotonic()
+        cached = self._presigned_url_cache.get(cache_key)
+        if cached is not None and now < cached[0] - PRESIGNED_URL_REFRESH_MARGIN:
+            self._presigned_url_cache.move_to_end(cache_key)
+            return {
+                "success": True,
+                "url": cached[1],
+                "expires_in": int(cached[0] - now)
+            }
+        
         try:
             url = self.s3_client.generate_presigned_url(
                 'get_object',
@@ -182,15 +270,21 @@ class CekatS3Client:
                 ExpiresIn=expiration
             )
             
+            self._presigned_url_cache[cache_key] = (now + expiration, url)
+            self._presigned_url_cache.move_to_end(cache_key)
+            if len(self._presigned_url_cache) > PRESIGNED_URL_CACHE_SIZE:
+                self._presigned_url_cache.popitem(last=False)
+            
             return {
                 "success": True,
                 "url": url,
                 "expires_in": expiration
             }
             
-        except Exception as e:
-            logger.error(f"Failed to generate presigned URL for {s3_key}: {e}")
-            return {"success": False, "error": str(e)}
+        except ClientError as e:
+            code = _error_code(e)
+            logger.error("Failed to generate presigned URL for %s: %s", s3_key, code)
+            return {"success": False, "error": code}
 
 
 # Global instance
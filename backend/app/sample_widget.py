@@ -1,7 +1,9 @@
 from __future__ import annotations
 
 import base64
+import logging
 from dataclasses import dataclass, field
+from functools import lru_cache
 from datetime import datetime
 from typing import Sequence, Union
 import io
@@ -21,6 +23,8 @@ from chatkit.widgets import (
     WidgetRoot,
 )
 
+logger = logging.getLogger(__name__)
+
 WEATHER_ICON_COLOR = "#1D4ED8"
 WEATHER_ICON_ACCENT = "#DBEAFE"
 
@@ -808,20 +812,26 @@ class NavButtonData:
 
 def render_nav_button_widget(data: NavButtonData) -> Card:
     """Build a simple navigation button widget."""
-    print(f"[RENDER_NAV_BUTTON_WIDGET] Rendering nav button with title: {data.title}, url: {data.url}")
-    
+    logger.debug("[RENDER_NAV_BUTTON_WIDGET] Rendering nav button with title: %s, url: %s", data.title, data.url)
+    return _nav_button_card(data.title, data.url)
+
+
+@lru_cache(maxsize=128)
+def _nav_button_card(title: str, url: str) -> Card:
+    # The card only depends on title + url, and navigation targets are a small fixed
+    # set, so the validated widget tree is built once per page and reused (read-only)
     return Card(
         key="nav_button_widget",
         size="sm",
         children=[
             Button(
-                label=data.title,
+                label=title,
                 style="primary",
                 iconEnd="external-link",
                 block=True,
                 onClickAction=ActionConfig(
                     type="navigation.open",
-                    payload={"url": data.url},
+                    payload={"url": url},
                     handler="client"
                 )
             )
@@ -859,14 +869,15 @@ def _get_image_dimensions_from_data_url(data_url: str) -> tuple[int, int]:
         img = PILImage.open(io.BytesIO(image_bytes))
         return img.size  # Returns (width, height)
     except Exception as e:
-        print(f"[WIDGET] Error getting image dimensions: {e}")
+        logger.warning("[WIDGET] Error getting image dimensions: %s", e)
         # Default to 1024x1024 if can't determine
         return (1024, 1024)
 
 
 def render_image_generation_widget(data: ImageGenerationWidgetData) -> Card:
     """Build an image generation display widget."""
-    print(f"[RENDER_IMAGE_GENERATION_WIDGET] Rendering image generation widget with URL: {data.image_url}")
+    # image_url is usually a multi-MB data URL; only log its head
+    logger.debug("[RENDER_IMAGE_GENERATION_WIDGET] Rendering image generation widget with URL: %.80s", data.image_url)
     
     return Card(
         key="image_generation",
@@ -2,9 +2,14 @@
 
 import inspect
 import logging
+import os
+import secrets
+import time
 from datetime import datetime
-from typing import Any, AsyncIterator
-from uuid import uuid4
+from typing import Any, AsyncIterator, Callable
+
+# Disable tracing for performance - MUST be set before the agents SDK is imported
+os.environ.setdefault("OPENAI_AGENTS_DISABLE_TRACING", "true")
 
 from agents import Agent, Runner, WebSearchTool, ModelSettings, RunConfig
 try:
@@ -16,12 +21,14 @@ except ImportError:
     ImageGenerationTool = None
     ImageGeneration = None
 from chatkit.agents import stream_agent_response
-from chatkit.server import ChatKitServer
+from chatkit.server import ChatKitServer, stream_widget
 from chatkit.types import (
+    AssistantMessageItem,
     Attachment,
     ClientToolCallItem,
     HiddenContextItem,
     ThreadItem,
+    ThreadItemDoneEvent,
     ThreadMetadata,
     ThreadStreamEvent,
     UserMessageItem,
@@ -40,32 +47,103 @@ from .tools import (
 # Removed docs widget import
     navigate_to_url,
     generate_image,
+    page_title_from_url,
 )
 from .agent_prompt import create_prompt_tool
 from .constants import INSTRUCTIONS, MODEL
 from .memory_store import MemoryStore
+from .sample_widget import NavButtonData, nav_button_copy_text, render_nav_button_widget
 from .session_context import session_manager
 
 
 # If you want to check what's going on under the hood, set this to DEBUG
 logging.basicConfig(level=logging.INFO)
 
+logger = logging.getLogger(__name__)
+
+# Run configuration is read-only and shared by every request
+_LOW_EFFORT_REASONING = {"effort": "low"}
+# The SDK already runs a turn's function tools concurrently; ask the model to batch
+# independent calls (docs search + navigation, ...) into one turn so they overlap
+_RUN_CONFIG = RunConfig(
+    model_settings=ModelSettings(reasoning=_LOW_EFFORT_REASONING, parallel_tool_calls=True)
+)
+_MAX_TURNS = 3  # Limit to 3 turns for speed
+
+# Tools are stateless descriptors, so one ImageGenerationTool is shared by all servers
+_IMAGE_GENERATION_TOOL = (
+    ImageGenerationTool(
+        tool_config=ImageGeneration(
+            type="image_generation",
+            model="gpt-image-1-mini",
+            quality="low",
+            size="1024x1024",
+            partial_images=1,
+        ),
+    )
+    if HAS_IMAGE_GENERATION
+    else None
+)
+
 
 def _gen_id(prefix: str) -> str:
-    return f"{prefix}_{uuid4().hex[:8]}"
+    return f"{prefix}_{secrets.token_hex(4)}"
 
 
 def _is_tool_completion_item(item: Any) -> bool:
-    return isinstance(item, ClientToolCallItem)
+    # ClientToolCallItem is a leaf model, so an identity check is enough
+    return type(item) is ClientToolCallItem
+
+
+assert not ClientToolCallItem.__subclasses__(), "_is_tool_completion_item expects a leaf type"
 
 
 def _user_message_text(item: UserMessageItem) -> str:
-    parts: list[str] = []
-    for part in item.content:
-        text = getattr(part, "text", None)
-        if text:
-            parts.append(text)
-    return " ".join(parts).strip()
+    return " ".join([text for part in item.content if (text := getattr(part, "text", None))]).strip()
+
+
+def _resolve_converter_fallback(
+    converter: Any,
+) -> tuple[Callable[..., Any], bool, str | None] | None:
+    """Find the converter's fallback method and how it takes the thread argument.
+
+    Returns ``(method, thread_positional, thread_kwarg)`` for the first matching
+    method, or ``None`` if the converter has none. Resolved once per server so
+    ``inspect.signature`` stays off the request path.
+    """
+    for attr in (
+        "to_input_item",
+        "convert",
+        "convert_item",
+        "convert_thread_item",
+    ):
+        method = getattr(converter, attr, None)
+        if method is None:
+            continue
+        try:
+            signature = inspect.signature(method)
+        except (TypeError, ValueError):
+            return method, False, None
+
+        params = [
+            parameter
+            for parameter in signature.parameters.values()
+            if parameter.kind
+            not in (
+                inspect.Parameter.VAR_POSITIONAL,
+                inspect.Parameter.VAR_KEYWORD,
+            )
+        ]
+        if len(params) >= 2:
+            next_param = params[1]
+            if next_param.kind in (
+                inspect.Parameter.POSITIONAL_ONLY,
+                inspect.Parameter.POSITIONAL_OR_KEYWORD,
+            ):
+                return method, True, None
+            return method, False, next_param.name
+        return method, False, None
+    return None
 
 
 class FactAssistantServer(ChatKitServer[dict[str, Any]]):
@@ -78,20 +156,8 @@ class FactAssistantServer(ChatKitServer[dict[str, Any]]):
         tools = [WebSearchTool(), match_cekat_docs_v1, create_prompt_tool, generate_image, navigate_to_url]
         
         # Add ImageGenerationTool if available (for partial_images support)
-        if HAS_IMAGE_GENERATION:
-            tools.append(ImageGenerationTool(
-                tool_config=ImageGeneration(
-                    type="image_generation",
-                    model="gpt-image-1-mini",
-                    quality="low",
-                    size="1024x1024",
-                    partial_images=1, 
-                ),
-            ))
-        
-        # Disable tracing for performance - set environment variable
-        import os
-        os.environ['OPENAI_TRACING_DISABLED'] = 'true'
+        if _IMAGE_GENERATION_TOOL is not None:
+            tools.append(_IMAGE_GENERATION_TOOL)
         
         self.assistant = Agent[FactAgentContext](
             model=MODEL,
@@ -100,7 +166,8 @@ class FactAssistantServer(ChatKitServer[dict[str, Any]]):
         
             tools=tools,  # type: ignore[arg-type
         )
-        self._thread_item_converter = self._init_thread_item_converter()
+        self._thread_item_converter = CustomThreadItemConverter()
+        self._converter_fallback = _resolve_converter_fallback(self._thread_item_converter)
 
     async def respond(
         self,
@@ -108,19 +175,16 @@ class FactAssistantServer(ChatKitServer[dict[str, Any]]):
         item: UserMessageItem | None,
         context: dict[str, Any],
     ) -> AsyncIterator[ThreadStreamEvent]:
-        # Debug logging - log user request
-        if item:
-            user_content = _user_message_text(item)
-            print(f"👤 [USER REQUEST] {user_content}")
-        
         # Session context management
         session_id = thread.id
         conversation_context = None
         
         if item:
-            # Extract user message content
+            # Extract user message content once for logging and session context
             user_content = _user_message_text(item)
-            session_manager.add_user_message(session_id, user_content)
+            logger.debug("[USER REQUEST] %s", user_content)
+            # Prior turns only; this turn is recorded after the response streams
+            conversation_context = session_manager.get_session_context(session_id, max_turns=2)
         
         agent_context = FactAgentContext(
             thread=thread,
@@ -135,132 +199,91 @@ class FactAssistantServer(ChatKitServer[dict[str, Any]]):
         if target_item is None or _is_tool_completion_item(target_item):
             return
 
+        # _to_agent_input already prefers the converter's to_agent_input result
         agent_input = await self._to_agent_input(thread, target_item)
         if agent_input is None:
             return
 
-        # Use the converter to get proper input format for Agent SDK
-        converter = CustomThreadItemConverter()
-        proper_input = await converter.to_agent_input(target_item, thread)
-        
-        # If converter returns None, use the original agent_input
-        if proper_input is not None:
-            agent_input = proper_input
-
-        # Inject session context into agent input - reduced to 1 for fastest processing
-        if item and session_id in session_manager.sessions:
-            conversation_context = session_manager.get_session_context(session_id, max_turns=2)
-            if conversation_context and "CONVERSATION CONTEXT" in conversation_context:
-                # agent_input is a string, so we can directly prepend context
-                if isinstance(agent_input, str):
-                    original_content = agent_input
-                    agent_input = f"{conversation_context}\n\n{original_content}"
-                    # Session context injected silently for performance
-                else:
-                    print(f"🔍 Unexpected agent_input type: {type(agent_input)}")
+        # Inject session context into agent input
+        if conversation_context:
+            # agent_input is a string, so we can directly prepend context
+            if isinstance(agent_input, str):
+                agent_input = "".join((conversation_context, "\n\n", agent_input))
+            else:
+                logger.warning("Unexpected agent_input type: %s", type(agent_input))
 
         # Track request timing
-        import time
         request_start = time.time()
         
         result = Runner.run_streamed(
             self.assistant,
             agent_input,
             context=agent_context,
-            max_turns=3,  # Limit to 3 turns for speed
-            run_config=RunConfig(
-                model_settings=ModelSettings(       
-                    reasoning={"effort": "low"},
-                )
-            )
+            max_turns=_MAX_TURNS,
+            run_config=_RUN_CONFIG,
         )
 
         # Track assistant response
-        assistant_response_parts = []
-        tool_calls_used = []
-        assistant_content = ""
-        
-        turn_count = 0
-        image_generation_called = False
+        assistant_response_parts: list[str] = []
+        tool_calls_used: list[dict[str, Any]] = []
         
-        async for event in stream_agent_response(agent_context, result):
-            # Track image generation events - log EVERY event type for debugging
-            event_type = type(event).__name__
-            
-            # Check for tool call events
-            if hasattr(event, 'tool_call') and event.tool_call:
-                tool_name = getattr(event.tool_call, 'name', 'unknown')
-                tool_args = getattr(event.tool_call, 'arguments', {})
-                print(f"🔧 [SERVER] Tool call detected: {tool_name}")
-                print(f"🔧 [SERVER] Tool arguments: {tool_args}")
-                if tool_name == 'image_generation' or tool_name == 'generate_image':
-                    image_generation_called = True
-                    print(f"🖼️ [SERVER] Image generation tool triggered!")
+        # In try/finally from here so the turn is recorded even if the client
+        # disconnects (or the run fails) mid-stream
+        try:
+            async for event in stream_agent_response(agent_context, result):
+                # Only completed items carry final content; dispatch on concrete
+                # event/item types instead of probing attributes on every event
+                if type(event) is ThreadItemDoneEvent:
+                    done_item = event.item
+                    if isinstance(done_item, AssistantMessageItem):
+                        # Track assistant response content
+                        assistant_response_parts.extend(
+                            block.text for block in done_item.content if block.text
+                        )
+                    elif isinstance(done_item, ClientToolCallItem):
+                        # Track client tool calls
+                        logger.debug("[SERVER] Tracking tool call: %s", done_item.name)
+                        tool_calls_used.append({
+                            'name': done_item.name,
+                            'arguments': done_item.arguments
+                        })
             
-            # Track assistant response content from ThreadItemUpdated
-            if hasattr(event, 'item') and event.item and hasattr(event.item, 'content'):
-                # Extract text content from item
-                for block in event.item.content:
-                    if hasattr(block, 'text') and block.text:
-                        content_str = block.text
-                        assistant_response_parts.append(content_str)
-                        assistant_content += content_str + " "
+                yield event
             
-            # Track tool calls
-            if hasattr(event, 'tool_call') and event.tool_call:
-                tool_name = getattr(event.tool_call, 'name', 'unknown')
-                tool_args = getattr(event.tool_call, 'arguments', {})
-                print(f"📋 [SERVER] Tracking tool call: {tool_name}")
-                tool_calls_used.append({
-                    'name': tool_name,
-                    'arguments': tool_args
-                })
-                turn_count += 1
+            # Stream navigation widget right after the text response; the session
+            # write runs afterwards in finally so it never delays the widget
+            navigate_url_info = agent_context.request_context.get('navigate_url_info')
+            if navigate_url_info and item:
+                try:
+                    url = navigate_url_info.get('url', '')
                 
-            
-            yield event
-        
-        # Build assistant content from parts
-        if assistant_response_parts and item:
-            assistant_content = " ".join(assistant_response_parts).strip()
-            
-            # Content already processed above
-            if assistant_content:
-                # Logging removed for performance
-                session_manager.add_assistant_message(
-                    session_id, 
-                    assistant_content, 
-                    tool_calls=tool_calls_used if tool_calls_used else None
-                )
-        
-        # Stream navigation widget AFTER text response completes
-        navigate_url_info = agent_context.request_context.get('navigate_url_info')
-        if navigate_url_info and item:
-            from .sample_widget import render_nav_button_widget, nav_button_copy_text, NavButtonData
-            from chatkit.server import stream_widget
-            
-            try:
-                url = navigate_url_info.get('url', '')
-                page_name = url.split('/')[-1] or url.split('/')[-2]
-                page_title = page_name.replace('-', ' ').title()
+                    widget_data = NavButtonData(
+                        title=page_title_from_url(url),
+                        description=navigate_url_info.get('description', ''),
+                        button_text=navigate_url_info.get('link_text', 'Buka Halaman'),
+                        url=url,
+                        icon="🔗"
+                    )
+                    widget = render_nav_button_widget(widget_data)
+                    copy_text = nav_button_copy_text(widget_data)
                 
-                widget_data = NavButtonData(
-                    title=page_title,
-                    description=navigate_url_info.get('description', ''),
-                    button_text=navigate_url_info.get('link_text', 'Buka Halaman'),
-                    url=url,
-                    icon="🔗"
+                    logger.debug("[SERVER] Streaming navigation widget for: %s", url)
+                    # Stream widget events AFTER text response
+                    async for widget_event in stream_widget(thread, widget, copy_text=copy_text):
+                        yield widget_event
+                    logger.debug("[SERVER] Navigation widget streamed")
+                except Exception as e:
+                    logger.error("[SERVER] Failed to stream widget: %s", e)
+        finally:
+            # Record user message and assistant response in one session write
+            if item:
+                assistant_content = " ".join(assistant_response_parts).strip()
+                session_manager.record_turn(
+                    session_id,
+                    user_content,
+                    assistant_content,
+                    tool_calls=tool_calls_used if tool_calls_used else None
                 )
-                widget = render_nav_button_widget(widget_data)
-                copy_text = nav_button_copy_text(widget_data)
-                
-                print(f"🔄 [SERVER] Streaming navigation widget for: {url}")
-                # Stream widget events AFTER text response
-                async for widget_event in stream_widget(thread, widget, copy_text=copy_text):
-                    yield widget_event
-                print(f"✅ [SERVER] Navigation widget streamed")
-            except Exception as e:
-                print(f"❌ [SERVER] Failed to stream widget: {e}")
         
         return
 
@@ -291,17 +314,8 @@ class FactAssistantServer(ChatKitServer[dict[str, Any]]):
 
     async def to_message_content(self, _input: Attachment) -> ResponseInputImageParam | ResponseInputFileParam:
         """Convert attachment to message content for ChatKit."""
-        # Delegate to CustomThreadItemConverter
-        converter = CustomThreadItemConverter()
-        return await converter.attachment_to_message_content(_input)
-
-    def _init_thread_item_converter(self) -> Any | None:
-        """Initialize custom ThreadItemConverter untuk handle attachments."""
-        try:
-            return CustomThreadItemConverter()
-        except Exception as e:
-            print(f"[ERROR] Failed to initialize custom converter: {e}")
-            return None
+        # Delegate to the shared CustomThreadItemConverter
+        return await self._thread_item_converter.attachment_to_message_content(_input)
 
     async def _latest_thread_item(
         self, thread: ThreadMetadata, context: dict[str, Any]
@@ -330,46 +344,18 @@ class FactAssistantServer(ChatKitServer[dict[str, Any]]):
                     if result is not None:
                         return result
                 except Exception as e:
-                    print(f"[ERROR] Custom converter failed: {e}")
+                    logger.error("Custom converter failed: %s", e)
             
-            # Fallback to original method discovery
-            for attr in (
-                "to_input_item",
-                "convert",
-                "convert_item",
-                "convert_thread_item",
-            ):
-                method = getattr(converter, attr, None)
-                if method is None:
-                    continue
-                call_args: list[Any] = [item]
-                call_kwargs: dict[str, Any] = {}
-                try:
-                    signature = inspect.signature(method)
-                except (TypeError, ValueError):
-                    signature = None
-
-                if signature is not None:
-                    params = [
-                        parameter
-                        for parameter in signature.parameters.values()
-                        if parameter.kind
-                        not in (
-                            inspect.Parameter.VAR_POSITIONAL,
-                            inspect.Parameter.VAR_KEYWORD,
-                        )
-                    ]
-                    if len(params) >= 2:
-                        next_param = params[1]
-                        if next_param.kind in (
-                            inspect.Parameter.POSITIONAL_ONLY,
-                            inspect.Parameter.POSITIONAL_OR_KEYWORD,
-                        ):
-                            call_args.append(thread)
-                        else:
-                            call_kwargs[next_param.name] = thread
-
-                result = method(*call_args, **call_kwargs)
+            # Fallback to the method discovered once in __init__
+            fallback = self._converter_fallback
+            if fallback is not None:
+                method, thread_positional, thread_kwarg = fallback
+                if thread_positional:
+                    result = method(item, thread)
+                elif thread_kwarg is not None:
+                    result = method(item, **{thread_kwarg: thread})
+                else:
+                    result = method(item)
                 if inspect.isawaitable(result):
                     return await result
                 return result
@@ -1,10 +1,37 @@
 """Session context management untuk ChatKit server - in-memory only for performance."""
 
+import sys
+import threading
+import time
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import Deque, Dict, List, Any, Optional
+from collections import OrderedDict, deque
+from itertools import islice
 from dataclasses import dataclass
 
-@dataclass
+# Interned role names so role comparisons hit the identity fast path
+_USER = sys.intern('user')
+_ASSISTANT = sys.intern('assistant')
+
+# Turns kept per session; only the most recent few are ever sent as context
+MAX_HISTORY_TURNS = 500
+
+# Line prefix per role used when rendering recent context
+_ROLE_PREFIXES = {_USER: 'User: ', _ASSISTANT: 'Assistant: '}
+
+def _format_turn(role: str, content: str, tool_calls: Optional[List[Dict[str, Any]]]) -> str:
+    """Render satu turn sebagai baris context; kosong untuk role yang tidak ditampilkan."""
+    prefix = _ROLE_PREFIXES.get(role)
+    if prefix is None:
+        return ""
+    if tool_calls and role == _ASSISTANT:
+        return "\n".join([
+            prefix + content,
+            *(f"  [Tool: {tool_call.get('name', 'unknown')}]" for tool_call in tool_calls),
+        ])
+    return prefix + content
+
+@dataclass(slots=True)
 class ConversationTurn:
     """Single turn dalam percakapan."""
     timestamp: str
@@ -12,59 +39,67 @@ class ConversationTurn:
     content: str
     tool_calls: Optional[List[Dict[str, Any]]] = None
     metadata: Optional[Dict[str, Any]] = None
+    formatted: str = ""  # context line(s), rendered once at insert time
 
-@dataclass
+@dataclass(slots=True)
 class SessionContext:
     """Context untuk satu session percakapan."""
     session_id: str
     created_at: str
     last_updated: str
-    conversation_history: List[ConversationTurn]
+    conversation_history: Deque[ConversationTurn]
     user_preferences: Dict[str, Any]
     session_metadata: Dict[str, Any]
+    last_updated_ts: float = 0.0  # epoch seconds mirror of last_updated for cheap age checks
+    # Running counters so get_summary never rescans history; they also keep
+    # counting turns already evicted from the bounded deque
+    total_turns: int = 0
+    user_turns: int = 0
+    assistant_turns: int = 0
     
     def add_turn(self, role: str, content: str, tool_calls: Optional[List[Dict[str, Any]]] = None, metadata: Optional[Dict[str, Any]] = None):
         """Tambahkan turn baru ke conversation history."""
+        now = datetime.now()
+        now_iso = now.isoformat()
+        role = sys.intern(role)
         turn = ConversationTurn(
-            timestamp=datetime.now().isoformat(),
+            timestamp=now_iso,
             role=role,
             content=content,
             tool_calls=tool_calls,
-            metadata=metadata
+            metadata=metadata,
+            formatted=_format_turn(role, content, tool_calls)
         )
         self.conversation_history.append(turn)
-        self.last_updated = datetime.now().isoformat()
+        self.total_turns += 1
+        if turn.role == _USER:
+            self.user_turns += 1
+        elif turn.role == _ASSISTANT:
+            self.assistant_turns += 1
+        self.last_updated = now_iso
+        self.last_updated_ts = now.timestamp()
     
     def get_recent_context(self, max_turns: int = 10) -> str:
         """Ambil context dari percakapan terakhir."""
-        recent_turns = self.conversation_history[-max_turns:] if len(self.conversation_history) > max_turns else self.conversation_history
-        
-        context_parts = []
-        for turn in recent_turns:
-            if turn.role == 'user':
-                context_parts.append(f"User: {turn.content}")
-            elif turn.role == 'assistant':
-                context_parts.append(f"Assistant: {turn.content}")
-                if turn.tool_calls:
-                    for tool_call in turn.tool_calls:
-                        context_parts.append(f"  [Tool: {tool_call.get('name', 'unknown')}]")
-        
-        return "\n".join(context_parts)
+        # deque has no slicing; walk back max_turns from the right end instead
+        recent_turns = list(islice(reversed(self.conversation_history), max_turns))
+        recent_turns.reverse()
+        return "\n".join([turn.formatted for turn in recent_turns if turn.formatted])
     
     def get_summary(self) -> str:
         """Buat summary dari session."""
-        total_turns = len(self.conversation_history)
-        user_turns = len([t for t in self.conversation_history if t.role == 'user'])
-        assistant_turns = len([t for t in self.conversation_history if t.role == 'assistant'])
-        
-        return f"Session {self.session_id}: {total_turns} turns ({user_turns} user, {assistant_turns} assistant) - Last updated: {self.last_updated}"
+        return f"Session {self.session_id}: {self.total_turns} turns ({self.user_turns} user, {self.assistant_turns} assistant) - Last updated: {self.last_updated}"
 
 class SessionContextManager:
     """Manager untuk mengelola session contexts - in-memory only, no file storage."""
     
-    def __init__(self):
-        # In-memory storage only - no file I/O for performance
-        self.sessions: Dict[str, SessionContext] = {}
+    def __init__(self, max_sessions: int = 10000):
+        # In-memory storage only - no file I/O for performance.
+        # Kept in LRU order so the least recently used session is evicted past the cap.
+        self.sessions: OrderedDict[str, SessionContext] = OrderedDict()
+        self.max_sessions = max_sessions
+        # Reentrant so record_turn/add_* can call get_or_create_session while holding it
+        self._lock = threading.RLock()
     
     def _save_sessions(self):
         """No-op: Sessions are in-memory only for performance."""
@@ -73,72 +108,96 @@ class SessionContextManager:
     
     def get_or_create_session(self, session_id: str) -> SessionContext:
         """Ambil atau buat session context baru."""
-        if session_id not in self.sessions:
-            self.sessions[session_id] = SessionContext(
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if session is not None:
+                self.sessions.move_to_end(session_id)
+                return session
+        
+            now = datetime.now()
+            now_iso = now.isoformat()
+            session = self.sessions[session_id] = SessionContext(
                 session_id=session_id,
-                created_at=datetime.now().isoformat(),
-                last_updated=datetime.now().isoformat(),
-                conversation_history=[],
+                created_at=now_iso,
+                last_updated=now_iso,
+                conversation_history=deque(maxlen=MAX_HISTORY_TURNS),
                 user_preferences={},
-                session_metadata={}
+                session_metadata={},
+                last_updated_ts=now.timestamp()
             )
-            # Session created silently for performance
-            pass
-        return self.sessions[session_id]
+            if len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+            return session
     
     def add_user_message(self, session_id: str, content: str, metadata: Optional[Dict[str, Any]] = None):
         """Tambahkan user message ke session."""
-        session = self.get_or_create_session(session_id)
-        session.add_turn('user', content, metadata=metadata)
-        self._save_sessions()
-        # User message added silently for performance
+        with self._lock:
+            session = self.get_or_create_session(session_id)
+            session.add_turn(_USER, content, metadata=metadata)
+            self._save_sessions()
+            # User message added silently for performance
     
     def add_assistant_message(self, session_id: str, content: str, tool_calls: Optional[List[Dict[str, Any]]] = None, metadata: Optional[Dict[str, Any]] = None):
         """Tambahkan assistant message ke session."""
-        session = self.get_or_create_session(session_id)
-        session.add_turn('assistant', content, tool_calls=tool_calls, metadata=metadata)
-        self._save_sessions()
-        # Assistant message added silently for performance
+        with self._lock:
+            session = self.get_or_create_session(session_id)
+            session.add_turn(_ASSISTANT, content, tool_calls=tool_calls, metadata=metadata)
+            self._save_sessions()
+            # Assistant message added silently for performance
     
-    def get_session_context(self, session_id: str, max_turns: int = 10) -> str:
-        """Ambil context string untuk session."""
-        if session_id not in self.sessions:
-            return f"No previous context for session {session_id}"
-        
-        session = self.sessions[session_id]
-        recent_context = session.get_recent_context(max_turns)
+    def record_turn(self, session_id: str, user_content: str, assistant_content: Optional[str] = None, tool_calls: Optional[List[Dict[str, Any]]] = None):
+        """Tambahkan user message dan assistant response ke session sekaligus."""
+        with self._lock:
+            session = self.get_or_create_session(session_id)
+            session.add_turn(_USER, user_content)
+            if assistant_content:
+                session.add_turn(_ASSISTANT, assistant_content, tool_calls=tool_calls)
+            self._save_sessions()
+    
+    def get_session_context(self, session_id: str, max_turns: int = 10) -> Optional[str]:
+        """Ambil context string untuk session, atau None jika belum ada history."""
+        # Lock so a concurrent record_turn cannot mutate the deque mid-iteration
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if session is None or not session.conversation_history:
+                return None
+            
+            recent_context = session.get_recent_context(max_turns)
         
         if not recent_context.strip():
-            return f"Session {session_id} started - no conversation history yet"
+            return None
         
-        return f"=== CONVERSATION CONTEXT ===\n{recent_context}\n=== END CONTEXT ==="
+        return "".join(("=== CONVERSATION CONTEXT ===\n", recent_context, "\n=== END CONTEXT ==="))
     
     def get_session_summary(self, session_id: str) -> str:
         """Ambil summary session."""
-        if session_id not in self.sessions:
-            return f"Session {session_id} not found"
-        
-        return self.sessions[session_id].get_summary()
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                return f"Session {session_id} not found"
+            
+            return session.get_summary()
     
     def list_sessions(self) -> List[str]:
         """List semua session IDs."""
-        return list(self.sessions.keys())
+        with self._lock:
+            return list(self.sessions.keys())
     
     def cleanup_old_sessions(self, max_age_hours: int = 24):
         """Cleanup sessions yang sudah lama tidak digunakan."""
-        cutoff_time = datetime.now().timestamp() - (max_age_hours * 3600)
-        sessions_to_remove = []
+        with self._lock:
+            cutoff_time = time.time() - (max_age_hours * 3600)
+            sessions_to_remove = [
+                session_id
+                for session_id, session in self.sessions.items()
+                if session.last_updated_ts < cutoff_time
+            ]
         
-        for session_id, session in self.sessions.items():
-            last_updated = datetime.fromisoformat(session.last_updated).timestamp()
-            if last_updated < cutoff_time:
-                sessions_to_remove.append(session_id)
+            for session_id in sessions_to_remove:
+                del self.sessions[session_id]
         
-        for session_id in sessions_to_remove:
-            del self.sessions[session_id]
-        
-        if sessions_to_remove:
-            self._save_sessions()
+            if sessions_to_remove:
+                self._save_sessions()
 
 # Global instance
 session_manager = SessionContextManager()
@@ -1,28 +1,36 @@
 """Function tools for the ChatKit assistant."""
 
 import asyncio
+import json
 import logging
+import re
+import secrets
+import struct
 import time
+from collections import OrderedDict
 from datetime import datetime
-from typing import Any, Literal, Union
-from uuid import uuid4
+from functools import lru_cache
+from typing import Any, Final, Literal, Union
 
 from agents import RunContextWrapper, function_tool, model_settings
 from chatkit.agents import AgentContext, ClientToolCall
+from chatkit.types import HiddenContextItem, IconName, ProgressUpdateEvent, ThreadItemDoneEvent
 from openai.types.shared import reasoning, reasoning_effort
 from pydantic import ConfigDict, Field
 from typing import Annotated
 import os
 import base64
-from openai import AsyncOpenAI, OpenAI, max_retries
+from openai import AsyncOpenAI, max_retries
 
 from .facts import Fact, fact_store
 from .weather import (
     WeatherLookupError,
+    close_http_client as close_weather_http_client,
     retrieve_weather,
     normalize_unit as normalize_temperature_unit,
 )
 from .sample_widget import (
+    WeatherWidgetData,
     render_weather_widget, 
     weather_widget_copy_text,
     ImageGenerationWidgetData,
@@ -30,36 +38,183 @@ from .sample_widget import (
     image_generation_widget_copy_text
 )
 # Removed docs widget imports
-from .cekat_docs_memory import get_cekat_docs_rag
+from .cekat_docs_memory import EmbeddingBatcher, get_cekat_docs_rag, normalize_query
+
+logger = logging.getLogger(__name__)
+
+# Shared RAG instance; keeps its clients and caches warm across tool calls
+_DOCS_RAG = get_cekat_docs_rag()
+# Concurrent docs searches share one embeddings API request
+_EMBEDDING_BATCHER = EmbeddingBatcher(_DOCS_RAG)
+
+# Static docs widget texts; only the query / error detail is filled in per call
+_DOCS_NO_RESULTS_TEMPLATE: Final = (
+    "🔍 Tidak ada hasil ditemukan untuk '{query}'\n\n"
+    "💡 Saran:\n"
+    "• Coba kata kunci yang berbeda\n"
+    "• Gunakan istilah yang lebih umum\n"
+    "• Periksa ejaan kata kunci"
+)
+_DOCS_ERROR_TEMPLATE: Final = (
+    "❌ Error saat mencari '{query}'\n\n"
+    "🔧 Detail error: {error}\n\n"
+    "🆘 Solusi:\n"
+    "• Coba lagi dalam beberapa saat\n"
+    "• Periksa koneksi internet\n"
+    "• Hubungi support jika masalah berlanjut"
+)
+
+# In-flight docs searches keyed by normalized query, so concurrent identical
+# queries share one embedding + Supabase round trip
+_INFLIGHT_DOC_SEARCHES: dict[str, asyncio.Task[list[dict[str, Any]]]] = {}
+
+# Shared async client (one connection pool); None when no API key is configured
+_OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+_ASYNC_OPENAI = AsyncOpenAI(api_key=_OPENAI_API_KEY) if _OPENAI_API_KEY else None
+
+# Concurrent image-generation requests allowed across all tool calls (rate limits)
+_IMAGE_REQUEST_SEMAPHORE = asyncio.Semaphore(5)
+MAX_IMAGE_VARIATIONS = 4
+
+# Recent weather lookups with their rendered widget, keyed by (location, unit).
+# Forecasts change slowly, so repeat lookups within the TTL skip the HTTP calls.
+WEATHER_CACHE_TTL = 600.0  # seconds
+WEATHER_CACHE_SIZE = 256
+_WEATHER_CACHE: OrderedDict[tuple[str, str], tuple[float, WeatherWidgetData, Any, str]] = (
+    OrderedDict()
+)
+
+# Background S3 uploads: bounded concurrency, and strong references so pending
+# tasks are not garbage-collected and can be drained on shutdown
+_S3_UPLOAD_SEMAPHORE = asyncio.Semaphore(16)
+_BACKGROUND_TASKS: set[asyncio.Task[None]] = set()
 
 
+async def wait_for_background_tasks() -> None:
+    """Wait for pending background uploads (call on app shutdown)."""
+    if _BACKGROUND_TASKS:
+        await asyncio.gather(*_BACKGROUND_TASKS, return_exceptions=True)
+
+
+async def close_shared_clients() -> None:
+    """Close the pooled HTTP clients shared by the tools (call on app shutdown)."""
+    if _ASYNC_OPENAI is not None:
+        await _ASYNC_OPENAI.close()
+    await close_weather_http_client()
+
 def _gen_id(prefix: str) -> str:
-    return f"{prefix}_{uuid4().hex[:8]}"
+    return f"{prefix}_{secrets.token_hex(4)}"
+
+
+_DARK: Final = "dark"
+_LIGHT: Final = "light"
+SUPPORTED_COLOR_SCHEMES: Final = frozenset({_LIGHT, _DARK})
 
 
 def _normalize_color_scheme(value: str) -> str:
-    SUPPORTED_COLOR_SCHEMES = frozenset({"light", "dark"})
-    normalized = str(value).strip().lower()
+    normalized = (value if isinstance(value, str) else str(value)).strip().lower()
     if normalized in SUPPORTED_COLOR_SCHEMES:
         return normalized
-    if "dark" in normalized:
-        return "dark"
-    if "light" in normalized:
-        return "light"
+    if _DARK in normalized:
+        return _DARK
+    if _LIGHT in normalized:
+        return _LIGHT
     raise ValueError("Theme must be either 'light' or 'dark'.")
 
 
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def _png_size(data: bytes) -> tuple[int, int] | None:
+    """Read (width, height) from a PNG's IHDR header without decoding the image."""
+    if len(data) < 24 or data[:8] != _PNG_SIGNATURE:
+        return None
+    # 8-byte signature, IHDR length + type (8 bytes), then width/height as big-endian u32
+    width, height = struct.unpack(">II", data[16:24])
+    return width, height
+
+
+# Hardcoded Cekat pages and the keywords that navigate to them
+_CEKAT_PAGE_ALIASES: Final[dict[str, tuple[str, ...]]] = {
+    "https://chat.cekat.ai/chat": ("conversation", "conversations", "chat"),
+    "https://chat.cekat.ai/tickets": ("tickets", "ticket"),
+    "https://chat.cekat.ai/workflows": ("workflows", "workflow", "automation"),
+    "https://chat.cekat.ai/orders": ("orders", "order"),
+    "https://chat.cekat.ai/dashboard/analytics": ("analytics", "dashboard"),
+    "https://chat.cekat.ai/broadcasts": ("broadcasts", "broadcast", "campaign"),
+    "https://chat.cekat.ai/connected-platforms": ("connected-platforms", "platforms", "integration"),
+    "https://chat.cekat.ai/chatbots/chatbot-list": ("chatbots", "chatbot", "ai-agent", "ai-agents"),
+    "https://chat.cekat.ai/users/agent-management": ("agent-management", "agents", "human-agent"),
+    "https://chat.cekat.ai/products": ("products", "product"),
+    "https://chat.cekat.ai/followups": ("followups", "follow-up"),
+    "https://chat.cekat.ai/quick-reply": ("quick-reply", "quick-replies"),
+    "https://chat.cekat.ai/labels": ("labels", "label"),
+    "https://chat.cekat.ai/developers/api-tools": ("api-tools", "api", "developers"),
+    "https://documenter.getpostman.com/view/28427156/2sAXqtagQo": ("documentation", "docs", "postman"),
+}
+
+# Keyword -> URL lookup, built once at import
+_CEKAT_URLS: Final[dict[str, str]] = {
+    alias: page_url for page_url, aliases in _CEKAT_PAGE_ALIASES.items() for alias in aliases
+}
+
+
+async def _search_docs(query: str, limit: int) -> list[dict[str, Any]]:
+    embedding = None
+    if _DOCS_RAG.is_configured:
+        try:
+            embedding = await _EMBEDDING_BATCHER.embed(query)
+        except Exception as exc:  # noqa: BLE001
+            # search_docs embeds (and reports errors) itself when no vector is given
+            logger.warning("[TOOL] batched embedding failed: %s", exc)
+    # search_docs is blocking (Supabase RPC), so run it in a thread
+    # to keep parallel tool calls from serializing on the event loop.
+    return await asyncio.to_thread(_DOCS_RAG.search_docs, query, limit=limit, embedding=embedding)
+
+
+async def _search_docs_coalesced(query: str, limit: int = 10) -> list[dict[str, Any]]:
+    """Run rag.search_docs in a thread, joining an identical search already in flight."""
+    key = f"{limit}:{normalize_query(query)}"
+    task = _INFLIGHT_DOC_SEARCHES.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_search_docs(query, limit))
+        _INFLIGHT_DOC_SEARCHES[key] = task
+        task.add_done_callback(lambda _: _INFLIGHT_DOC_SEARCHES.pop(key, None))
+    # Shield so one caller being cancelled does not cancel the shared search
+    return await asyncio.shield(task)
+
+
+# Any page keyword inside free text; longest keywords first so "ai-agents" beats "ai-agent"
+_CEKAT_URL_PATTERN: Final = re.compile(
+    r"\b("
+    + "|".join(re.escape(k) for k in sorted(_CEKAT_URLS, key=len, reverse=True))
+    + r")\b"
+)
+
+
+@lru_cache(maxsize=256)
+def page_title_from_url(url: str) -> str:
+    """Turn the last path segment of a URL into a page title (cached per URL)."""
+    parts = url.rsplit('/', 2)
+    page_name = parts[-1] or parts[-2]
+    return page_name.replace('-', ' ').title()
+
+
 class FactAgentContext(AgentContext):
-    model_config = ConfigDict(arbitrary_types_allowed=True)
+    # Built once per request and only mutated by our own tools, so keep the
+    # schema eagerly compiled at import and skip validation on assignment
+    model_config = ConfigDict(
+        arbitrary_types_allowed=True,
+        validate_assignment=False,
+        extra="ignore",
+        defer_build=False,
+    )
     store: Annotated[Any, Field(exclude=True)]
     request_context: dict[str, Any]
 
 
 
 async def _stream_saved_hidden(ctx: RunContextWrapper[FactAgentContext], fact: Fact) -> None:
-    from chatkit.server import ThreadItemDoneEvent
-    from chatkit.types import HiddenContextItem
-    
     await ctx.context.stream(
         ThreadItemDoneEvent(
             item=HiddenContextItem(
@@ -74,25 +229,32 @@ async def _stream_saved_hidden(ctx: RunContextWrapper[FactAgentContext], fact: F
     )
 
 
+async def _stream_progress(
+    ctx: RunContextWrapper[FactAgentContext], text: str, icon: IconName
+) -> None:
+    """Show a progress line in the chat while a slow tool is working (best effort)."""
+    try:
+        await ctx.context.stream(ProgressUpdateEvent(icon=icon, text=text))
+    except Exception as exc:  # noqa: BLE001
+        logger.debug("Failed to stream tool progress: %s", exc)
+
+
 @function_tool(description_override="Record a fact shared by the user so it is saved immediately.")
 async def save_fact(
     ctx: RunContextWrapper[FactAgentContext],
     fact: str,
 ) -> dict[str, str] | None:
     try:
-        saved = await fact_store.create(text=fact)
-        confirmed = await fact_store.mark_saved(saved.id)
-        if confirmed is None:
-            raise ValueError("Failed to save fact")
+        confirmed = await fact_store.create_saved(text=fact)
         await _stream_saved_hidden(ctx, confirmed)
         ctx.context.client_tool_call = ClientToolCall(
             name="record_fact",
             arguments={"fact_id": confirmed.id, "fact_text": confirmed.text},
         )
-        print(f"FACT SAVED: {confirmed}")
+        logger.info("FACT SAVED: %s", confirmed)
         return {"fact_id": confirmed.id, "status": "saved"}
     except Exception:
-        logging.exception("Failed to save fact")
+        logger.exception("Failed to save fact")
         return None
 
 
@@ -104,7 +266,7 @@ async def switch_theme(
     theme: str,
 ) -> dict[str, str] | None:
     CLIENT_THEME_TOOL_NAME = "switch_theme"
-    logging.debug(f"Switching theme to {theme}")
+    logger.debug("Switching theme to %s", theme)
     try:
         requested = _normalize_color_scheme(theme)
         ctx.context.client_tool_call = ClientToolCall(
@@ -113,7 +275,7 @@ async def switch_theme(
         )
         return {"theme": requested}
     except Exception:
-        logging.exception("Failed to switch theme")
+        logger.exception("Failed to switch theme")
         return None
 
 
@@ -125,48 +287,56 @@ async def get_weather(
     location: str,
     unit: Literal["celsius", "fahrenheit"] | str | None = None,
 ) -> dict[str, str | None]:
-    print("[WeatherTool] tool invoked", {"location": location, "unit": unit})
+    start_time = time.perf_counter()
     try:
         normalized_unit = normalize_temperature_unit(unit)
     except WeatherLookupError as exc:
-        print("[WeatherTool] invalid unit", {"error": str(exc)})
+        logger.warning("[WeatherTool] invalid unit: %s", exc)
         raise ValueError(str(exc)) from exc
 
-    try:
-        data = await retrieve_weather(location, normalized_unit)
-    except WeatherLookupError as exc:
-        print("[WeatherTool] lookup failed", {"error": str(exc)})
-        raise ValueError(str(exc)) from exc
+    cache_key = (location.strip().lower(), normalized_unit)
+    cached = _WEATHER_CACHE.get(cache_key)
+    if cached is not None and time.monotonic() - cached[0] < WEATHER_CACHE_TTL:
+        _, data, widget, copy_text = cached
+        cache_status = "hit"
+    else:
+        cache_status = "miss"
+        await _stream_progress(ctx, f"Mengecek cuaca di {location}...", "globe")
+        try:
+            data = await retrieve_weather(location, normalized_unit)
+        except WeatherLookupError as exc:
+            logger.warning("[WeatherTool] lookup failed: %s", exc)
+            raise ValueError(str(exc)) from exc
 
-    print(
-        "[WeatherTool] lookup succeeded",
-        {
-            "location": data.location,
-            "temperature": data.temperature,
-            "unit": data.temperature_unit,
-        },
-    )
-    try:
-        widget = render_weather_widget(data)
-        copy_text = weather_widget_copy_text(data)
-        payload: Any
         try:
-            payload = widget.model_dump()
-        except AttributeError:
-            payload = widget
-        print("[WeatherTool] widget payload", payload)
-    except Exception as exc:  # noqa: BLE001
-        print("[WeatherTool] widget build failed", {"error": str(exc)})
-        raise ValueError("Weather data is currently unavailable for that location.") from exc
+            widget = render_weather_widget(data)
+            copy_text = weather_widget_copy_text(data)
+            # Lazy repr: the widget is only serialized if DEBUG logging is on
+            logger.debug("[WeatherTool] widget payload %r", widget)
+        except Exception as exc:  # noqa: BLE001
+            logger.error("[WeatherTool] widget build failed: %s", exc)
+            raise ValueError("Weather data is currently unavailable for that location.") from exc
+
+        _WEATHER_CACHE[cache_key] = (time.monotonic(), data, widget, copy_text)
+        _WEATHER_CACHE.move_to_end(cache_key)
+        if len(_WEATHER_CACHE) > WEATHER_CACHE_SIZE:
+            _WEATHER_CACHE.popitem(last=False)
 
-    print("[WeatherTool] streaming widget")
     try:
         await ctx.context.stream_widget(widget, copy_text=copy_text)
     except Exception as exc:  # noqa: BLE001
-        print("[WeatherTool] widget stream failed", {"error": str(exc)})
+        logger.error("[WeatherTool] widget stream failed: %s", exc)
         raise ValueError("Weather data is currently unavailable for that location.") from exc
 
-    print("[WeatherTool] widget streamed")
+    # One summary record per successful call; failures log at their own step above
+    logger.info(
+        "[WeatherTool] location=%s temperature=%s unit=%s cache=%s elapsed=%.3fs",
+        data.location,
+        data.temperature,
+        normalized_unit,
+        cache_status,
+        time.perf_counter() - start_time,
+    )
 
     observed = data.observation_time.isoformat() if data.observation_time else None
 
@@ -187,34 +357,33 @@ async def match_cekat_docs_v1(
     """Search Cekat documentation using RAG system with Supabase pgvector."""
     session_id = ctx.context.thread.id
     start_time = time.time()
-    print(f"🔍 [TOOL] match_cekat_docs_v1 started - query: '{query[:50]}'")
+    logger.info("[TOOL] match_cekat_docs_v1 started - query: '%.50s'", query)
+    
+    await _stream_progress(ctx, "Mencari di dokumentasi Cekat...", "search")
     
     try:
-        # Get RAG instance
-        rag = get_cekat_docs_rag()
-        
-        # Search for relevant documents - limit to 10 for comprehensive results
-        results = rag.search_docs(query, limit=10)
+        # Search for relevant documents - limit to 10 for comprehensive results.
+        results = await _search_docs_coalesced(query, limit=10)
         
         if results:
-            # Format results for the AI with truncated content
-            formatted_results = []
-            for doc in results:
-                # Truncate content to prevent huge responses - reduced to 500 for speed
-                content = doc.get("content", "")
-                if len(content) > 500:  # Limit content to 500 chars
-                    content = content[:500] + "..."
-                
-                formatted_results.append({
+            # Format results for the AI; content is capped at 500 chars to keep
+            # responses small (slicing is a no-op for shorter content)
+            formatted_results = [
+                {
                     "title": doc.get("title", "Untitled"),
-                    "content": content,
+                    "content": (doc.get("content") or "")[:500],
                     "url": doc.get("url", ""),
                     "category": doc.get("category", ""),
-                    "similarity": doc.get("similarity", 0)
-                })
+                    "similarity": doc.get("similarity", 0),
+                }
+                for doc in results
+            ]
             
             elapsed = time.time() - start_time
-            print(f"✅ [TOOL] match_cekat_docs_v1 completed in {elapsed:.2f}s - Found {len(formatted_results)} results")
+            logger.info(
+                "[TOOL] match_cekat_docs_v1 completed in %.2fs - Found %d results",
+                elapsed, len(formatted_results),
+            )
             
             return {
                 "query": query,
@@ -223,7 +392,7 @@ async def match_cekat_docs_v1(
             }
         else:
             elapsed = time.time() - start_time
-            print(f"⚠️ [TOOL] match_cekat_docs_v1 completed in {elapsed:.2f}s - No results found")
+            logger.info("[TOOL] match_cekat_docs_v1 completed in %.2fs - No results found", elapsed)
             return {
                 "query": query,
                 "results": [],
@@ -232,7 +401,7 @@ async def match_cekat_docs_v1(
             
     except Exception as exc:
         elapsed = time.time() - start_time
-        print(f"❌ [TOOL] match_cekat_docs_v1 failed in {elapsed:.2f}s - Error: {str(exc)[:100]}")
+        logger.error("[TOOL] match_cekat_docs_v1 failed in %.2fs - Error: %.100s", elapsed, exc)
         return {
             "query": query,
             "results": [],
@@ -251,38 +420,36 @@ async def create_cekat_docs_widget_from_results(
     status: str = "success"
 ) -> dict[str, str | None]:
     """Convert Cekat docs search results into a documentation widget."""
-    print("[CekatDocsWidget] tool invoked", {"query": query, "status": status})
+    logger.info("[CekatDocsWidget] tool invoked query=%s status=%s", query, status)
     
     try:
-        import json
-        
-        # Parse results from JSON string
+        # Parse results from JSON string (once; already-decoded lists pass through)
         try:
-            results_list = json.loads(results) if isinstance(results, str) else results
+            results_list = (
+                json.loads(results) if isinstance(results, (str, bytes)) else results
+            )
         except (json.JSONDecodeError, TypeError):
             results_list = []
         
         if status == "success" and results_list:
             # Format content for the widget with better structure
-            widget_content = f"🔍 Menemukan {len(results_list)} hasil untuk '{query}':\n\n"
+            parts = [f"🔍 Menemukan {len(results_list)} hasil untuk '{query}':\n\n"]
             
-            for i, doc in enumerate(results_list[:3], 1):  # Limit to top 3 for better readability
-                title = doc.get("title", "Untitled")
-                content = doc.get("content", "")
-                url = doc.get("url", "")
-                category = doc.get("category", "")
-                similarity = doc.get("similarity", 0)
+            for doc in results_list[:3]:  # Limit to top 3 for better readability
+                content = doc.get("content") or ""
                 
                 # Truncate content if too long
                 if len(content) > 200:
                     content = content[:200] + "..."
                 
                 # Format with emojis and better structure
-                widget_content += f"📄 {title}\n"
-                if category:
-                    widget_content += f"   🏷️ {category}\n"
-                widget_content += f"   📝 {content}\n"
-                widget_content += f"   ⭐ Relevansi: {similarity:.1f}\n\n"
+                parts.append(f"📄 {doc.get('title', 'Untitled')}\n")
+                if category := doc.get("category"):
+                    parts.append(f"   🏷️ {category}\n")
+                parts.append(f"   📝 {content}\n")
+                parts.append(f"   ⭐ Relevansi: {doc.get('similarity', 0):.1f}\n\n")
+            
+            widget_content = "".join(parts)
             
             # Create widget data
             widget_data_obj = DocsWidgetData(
@@ -295,11 +462,7 @@ async def create_cekat_docs_widget_from_results(
             
         elif status == "no_results":
             # Create widget for no results
-            widget_content = f"🔍 Tidak ada hasil ditemukan untuk '{query}'\n\n"
-            widget_content += "💡 Saran:\n"
-            widget_content += "• Coba kata kunci yang berbeda\n"
-            widget_content += "• Gunakan istilah yang lebih umum\n"
-            widget_content += "• Periksa ejaan kata kunci"
+            widget_content = _DOCS_NO_RESULTS_TEMPLATE.format(query=query)
             
             widget_data_obj = DocsWidgetData(
                 title=f"Pencarian: {query}",
@@ -315,12 +478,7 @@ async def create_cekat_docs_widget_from_results(
             if results_list and isinstance(results_list, list) and len(results_list) > 0:
                 error_msg = results_list[0].get("error", "Unknown error")
             
-            widget_content = f"❌ Error saat mencari '{query}'\n\n"
-            widget_content += f"🔧 Detail error: {error_msg}\n\n"
-            widget_content += "🆘 Solusi:\n"
-            widget_content += "• Coba lagi dalam beberapa saat\n"
-            widget_content += "• Periksa koneksi internet\n"
-            widget_content += "• Hubungi support jika masalah berlanjut"
+            widget_content = _DOCS_ERROR_TEMPLATE.format(query=query, error=error_msg)
             
             widget_data_obj = DocsWidgetData(
                 title=f"Error: {query}",
@@ -335,16 +493,14 @@ async def create_cekat_docs_widget_from_results(
         copy_text = docs_widget_copy_text(widget_data_obj)
         
         # Stream the widget to the client (same as weather widget)
-        print("[CekatDocsWidget] streaming widget")
+        logger.debug("[CekatDocsWidget] streaming widget")
         try:
             await ctx.context.stream_widget(widget, copy_text=copy_text)
         except Exception as exc:
-            print("[CekatDocsWidget] widget stream failed", {"error": str(exc)})
+            logger.error("[CekatDocsWidget] widget stream failed: %s", exc)
             raise ValueError("Documentation widget failed to stream.") from exc
         
-        print("[CekatDocsWidget] widget streamed")
-        
-        print("[CekatDocsWidget] widget created successfully")
+        logger.debug("[CekatDocsWidget] widget streamed")
         
         return {
             "query": query,
@@ -354,7 +510,7 @@ async def create_cekat_docs_widget_from_results(
         }
         
     except Exception as exc:
-        print("[CekatDocsWidget] error creating widget", {"error": str(exc)})
+        logger.error("[CekatDocsWidget] error creating widget: %s", exc)
         return {
             "query": query,
             "status": "error",
@@ -374,57 +530,19 @@ async def navigate_to_url(
 ) -> dict[str, str | None]:
     """Enable navigation to Cekat pages. MANDATORY to call after answering questions about Cekat features."""
     start_time = time.time()
-    print(f"🧭 [TOOL] navigate_to_url STARTED - URL: {url}, link_text: {link_text}")
-    
+    logger.info("[TOOL] navigate_to_url started - URL: %s, link_text: %s", url, link_text)
     
-    # Hardcoded Cekat URLs mapping
-    cekat_urls = {
-        "conversation": "https://chat.cekat.ai/chat",
-        "conversations": "https://chat.cekat.ai/chat",
-        "chat": "https://chat.cekat.ai/chat",
-        "tickets": "https://chat.cekat.ai/tickets",
-        "ticket": "https://chat.cekat.ai/tickets",
-        "workflows": "https://chat.cekat.ai/workflows",
-        "workflow": "https://chat.cekat.ai/workflows",
-        "automation": "https://chat.cekat.ai/workflows",
-        "orders": "https://chat.cekat.ai/orders",
-        "order": "https://chat.cekat.ai/orders",
-        "analytics": "https://chat.cekat.ai/dashboard/analytics",
-        "dashboard": "https://chat.cekat.ai/dashboard/analytics",
-        "broadcasts": "https://chat.cekat.ai/broadcasts",
-        "broadcast": "https://chat.cekat.ai/broadcasts",
-        "campaign": "https://chat.cekat.ai/broadcasts",
-        "connected-platforms": "https://chat.cekat.ai/connected-platforms",
-        "platforms": "https://chat.cekat.ai/connected-platforms",
-        "integration": "https://chat.cekat.ai/connected-platforms",
-        "chatbots": "https://chat.cekat.ai/chatbots/chatbot-list",
-        "chatbot": "https://chat.cekat.ai/chatbots/chatbot-list",
-        "ai-agent": "https://chat.cekat.ai/chatbots/chatbot-list",
-        "ai-agents": "https://chat.cekat.ai/chatbots/chatbot-list",
-        "agent-management": "https://chat.cekat.ai/users/agent-management",
-        "agents": "https://chat.cekat.ai/users/agent-management",
-        "human-agent": "https://chat.cekat.ai/users/agent-management",
-        "products": "https://chat.cekat.ai/products",
-        "product": "https://chat.cekat.ai/products",
-        "followups": "https://chat.cekat.ai/followups",
-        "follow-up": "https://chat.cekat.ai/followups",
-        "quick-reply": "https://chat.cekat.ai/quick-reply",
-        "quick-replies": "https://chat.cekat.ai/quick-reply",
-        "labels": "https://chat.cekat.ai/labels",
-        "label": "https://chat.cekat.ai/labels",
-        "api-tools": "https://chat.cekat.ai/developers/api-tools",
-        "api": "https://chat.cekat.ai/developers/api-tools",
-        "developers": "https://chat.cekat.ai/developers/api-tools",
-        "documentation": "https://documenter.getpostman.com/view/28427156/2sAXqtagQo",
-        "docs": "https://documenter.getpostman.com/view/28427156/2sAXqtagQo",
-        "postman": "https://documenter.getpostman.com/view/28427156/2sAXqtagQo",
-    }
     
     # Cek apakah URL adalah keyword yang sudah di-mapping
     url_lower = url.lower().strip()
-    if url_lower in cekat_urls:
-        url = cekat_urls[url_lower]
-        # URL mapping done silently for performance
+    mapped = _CEKAT_URLS.get(url_lower)
+    if mapped is None and "://" not in url_lower and "." not in url_lower:
+        # Not a URL: pick the page keyword out of free text ("halaman chatbots")
+        match = _CEKAT_URL_PATTERN.search(url_lower)
+        if match:
+            mapped = _CEKAT_URLS[match.group(1)]
+    if mapped is not None:
+        url = mapped
     
     # Validasi URL
     if not url.startswith(("http://", "https://")):
@@ -432,9 +550,7 @@ async def navigate_to_url(
     
     # Generate link text if not provided
     if not link_text:
-        # Extract page name from URL
-        page_name = url.split('/')[-1] or url.split('/')[-2]
-        link_text = f"Buka {page_name.replace('-', ' ').title()}"
+        link_text = f"Buka {page_title_from_url(url)}"
     
     try:
         # Store URL in context for later widget streaming (after response completes)
@@ -445,7 +561,7 @@ async def navigate_to_url(
         }
         
         elapsed = time.time() - start_time
-        print(f"✅ [TOOL] navigate_to_url completed in {elapsed:.2f}s")
+        logger.info("[TOOL] navigate_to_url completed in %.2fs", elapsed)
         
         return {
             "url": url,
@@ -455,7 +571,7 @@ async def navigate_to_url(
         }
     except Exception as exc:
         elapsed = time.time() - start_time
-        print(f"❌ [TOOL] navigate_to_url failed in {elapsed:.2f}s - Error: {str(exc)}")
+        logger.error("[TOOL] navigate_to_url failed in %.2fs - Error: %s", elapsed, exc)
         return {
             "url": url,
             "status": "error",
@@ -470,50 +586,58 @@ async def generate_image(
     ctx: RunContextWrapper[FactAgentContext],
     prompt: str,
     size: Literal["256x256", "512x512", "square", "portrait", "landscape"] | str = "512x512",
-    partial_images: int = 1,
+    variations: int = 1,
 ) -> dict[str, str | bool | None]:
     """Generate images using OpenAI's Responses API without streaming."""
-    print("=" * 80)
-    print("🎨 [IMAGE GENERATION TOOL] TOOL DIPANGGIL!")
-    print(f"🎨 [IMAGE] Prompt: {prompt}")
-    print(f"🎨 [IMAGE] Size: {size}")
-    print(f"🎨 [IMAGE] Partial images: {partial_images}")
-    print("=" * 80)
-    logging.info(f"[IMAGE GENERATION] Tool called with prompt: {prompt[:100]}")
+    logger.info("[IMAGE GENERATION] Tool called with prompt: %.100s", prompt)
+    logger.debug("[IMAGE] size=%s variations=%s", size, variations)
     
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        print("[IMAGE] ERROR: OPENAI_API_KEY not found")
+    client = _ASYNC_OPENAI
+    if client is None:
+        logger.error("[IMAGE] OPENAI_API_KEY not found")
         raise RuntimeError("Image generation requires OPENAI_API_KEY to be configured on the server.")
-    
-    client = OpenAI(api_key=api_key)
 
     try:
-        print(f"🎨 [IMAGE] Using Responses API with model=gpt-5")
+        logger.debug("[IMAGE] Using Responses API with model=gpt-5")
+        await _stream_progress(ctx, "Membuat gambar...", "images")
         
-        # Use Responses API without streaming
-        response = await asyncio.to_thread(
-            client.responses.create,
-            model="gpt-5",
-            input=prompt,
-            tools=[
-                {
-                    "type": "image_generation",
-                    "background": "transparent",
-                    "quality": "low",
-                }
-            ],
+        async def request_images() -> Any:
+            # Use Responses API without streaming; cap concurrent requests server-wide
+            async with _IMAGE_REQUEST_SEMAPHORE:
+                return await client.responses.create(
+                    model="gpt-5",
+                    input=prompt,
+                    tools=[
+                        {
+                            "type": "image_generation",
+                            "background": "transparent",
+                            "quality": "low",
+                        }
+                    ],
+                )
+        
+        # One request per requested variation, issued concurrently
+        request_count = max(1, min(variations, MAX_IMAGE_VARIATIONS))
+        responses = await asyncio.gather(
+            *(request_images() for _ in range(request_count)), return_exceptions=True
         )
+        failures = [r for r in responses if isinstance(r, BaseException)]
+        if len(failures) == len(responses):
+            raise failures[0]
+        for failure in failures:
+            logger.warning("[IMAGE] Variation request failed: %s", failure)
         
         # Extract image data from output
         image_data = [
             output.result
+            for response in responses
+            if not isinstance(response, BaseException)
             for output in response.output
             if output.type == "image_generation_call"
         ]
         
         if not image_data:
-            print("[IMAGE] ERROR: No images received")
+            logger.error("[IMAGE] No images received")
             raise RuntimeError("Image generation returned no images.")
         
         image_urls = []
@@ -529,92 +653,95 @@ async def generate_image(
                 file_obj = io.BytesIO(image_bytes)
                 
                 # Upload S3 di thread terpisah agar tidak blocking
-                upload_result = await asyncio.to_thread(
-                    attachment_store.s3_client.upload_fileobj,
-                    file_obj, s3_key, "image/png"
-                )
+                async with _S3_UPLOAD_SEMAPHORE:
+                    upload_result = await asyncio.to_thread(
+                        attachment_store.s3_client.upload_fileobj,
+                        file_obj, s3_key, "image/png"
+                    )
                 
                 if upload_result["success"]:
-                    s3_url = f"https://{attachment_store.s3_client.bucket_name}.s3.{attachment_store.s3_client.region}.amazonaws.com/{s3_key}"
-                    print(f"🖼️ [IMAGE] Background upload #{idx} completed: {s3_url}")
+                    s3_url = upload_result["url"]
+                    logger.debug("[IMAGE] Background upload #%d completed: %s", idx, s3_url)
                     return s3_url
                 else:
-                    print(f"🖼️ [IMAGE] Background upload #{idx} failed: {upload_result.get('error')}")
+                    logger.warning(
+                        "[IMAGE] Background upload #%d failed: %s", idx, upload_result.get("error")
+                    )
                     return None
             except Exception as e:
-                print(f"🖼️ [IMAGE] Background upload #{idx} error: {e}")
+                logger.warning("[IMAGE] Background upload #%d error: %s", idx, e)
                 return None
         
         # Process images - stream widget dulu dengan data URL, upload S3 di background
-        upload_tasks = []
+        prepared = []
         
         for idx, image_base64 in enumerate(image_data):
             try:
                 # Convert to data URL untuk immediate display
                 data_url = f"data:image/png;base64,{image_base64}"
+                # Decode sekali; bytes dipakai untuk dimensi dan upload S3
+                image_bytes = base64.b64decode(image_base64)
                 
-                # Get image dimensions from base64 data
-                try:
-                    from PIL import Image as PILImage  # type: ignore[import-untyped]
-                    import io
-                    image_bytes = base64.b64decode(image_base64)
-                    img = PILImage.open(io.BytesIO(image_bytes))
-                    img_width, img_height = img.size
-                    print(f"🖼️ [IMAGE] Image #{idx} dimensions: {img_width}x{img_height}")
-                except ImportError:
-                    print(f"🖼️ [IMAGE] PIL/Pillow not available, skipping dimension detection")
-                    img_width, img_height = None, None
-                except Exception as e:
-                    print(f"🖼️ [IMAGE] Could not get dimensions for image #{idx}: {e}")
-                    img_width, img_height = None, None
+                # Get image dimensions from the PNG header
+                dimensions = _png_size(image_bytes)
+                if dimensions:
+                    logger.debug("[IMAGE] Image #%d dimensions: %dx%d", idx, *dimensions)
+                else:
+                    logger.debug("[IMAGE] Could not get dimensions for image #%d: not a PNG", idx)
                 
-                # Stream widget immediately dengan data URL
-                print(f"🖼️ [IMAGE] Creating widget for image #{idx} (data URL length: {len(data_url)})")
+                logger.debug(
+                    "[IMAGE] Creating widget for image #%d (data URL length: %d)", idx, len(data_url)
+                )
                 widget_data = ImageGenerationWidgetData(
                     image_url=data_url,
                     prompt=prompt,
                     size=size,
                 
                 )
-                print(f"🖼️ [IMAGE] Rendering widget for image #{idx}")
                 widget = render_image_generation_widget(widget_data)
                 copy_text = image_generation_widget_copy_text(widget_data)
-                print(f"🖼️ [IMAGE] Streaming widget for image #{idx}...")
-                try:
-                    await ctx.context.stream_widget(widget, copy_text=copy_text)
-                    print(f"✅ [IMAGE] Widget #{idx} streamed successfully!")
-                except Exception as stream_error:
-                    print(f"❌ [IMAGE] ERROR streaming widget #{idx}: {stream_error}")
-                    import traceback
-                    traceback.print_exc()
-                    raise
-                
-                # Decode dan prepare upload ke S3 di background
-                image_bytes = base64.b64decode(image_base64)
-                upload_task = upload_to_s3_async(image_bytes, idx)
-                upload_tasks.append((idx, upload_task))
+                prepared.append((idx, image_bytes, widget, copy_text))
                 
             except Exception as e:
-                print(f"🖼️ [IMAGE] Error processing image #{idx}: {e}")
-                import traceback
-                traceback.print_exc()
+                logger.exception("[IMAGE] Error processing image #%d: %s", idx, e)
+        
+        # Stream semua widget sekaligus dengan data URL untuk immediate display
+        logger.debug("[IMAGE] Streaming %d widget(s)", len(prepared))
+        stream_results = await asyncio.gather(
+            *(ctx.context.stream_widget(widget, copy_text=copy_text)
+              for _, _, widget, copy_text in prepared),
+            return_exceptions=True,
+        )
+        
+        # Hanya upload gambar yang widget-nya berhasil di-stream
+        upload_items = []
+        for (idx, image_bytes, _, _), stream_result in zip(prepared, stream_results):
+            if isinstance(stream_result, BaseException):
+                logger.error("[IMAGE] Error streaming widget #%d: %s", idx, stream_result)
+                continue
+            logger.debug("[IMAGE] Widget #%d streamed", idx)
+            upload_items.append((idx, image_bytes))
         
         # Start S3 uploads in background but don't wait - return immediately
         # This allows user to see images immediately while S3 uploads happen async
-        if upload_tasks:
-            print(f"🔄 [IMAGE] Starting {len(upload_tasks)} background S3 upload(s) (non-blocking)...")
+        if upload_items:
+            logger.info("[IMAGE] Starting %d background S3 upload(s)", len(upload_items))
             # Create background task to handle uploads without blocking response
-            async def handle_uploads():
-                for idx, task in upload_tasks:
-                    try:
-                        s3_url = await task
-                        if s3_url:
-                            print(f"✅ [IMAGE] Background upload #{idx} succeeded: {s3_url}")
-                    except Exception as e:
-                        print(f"❌ [IMAGE] Background upload #{idx} error: {e}")
+            async def handle_uploads() -> None:
+                results = await asyncio.gather(
+                    *(upload_to_s3_async(image_bytes, idx) for idx, image_bytes in upload_items),
+                    return_exceptions=True,
+                )
+                for (idx, _), s3_url in zip(upload_items, results):
+                    if isinstance(s3_url, BaseException):
+                        logger.warning("[IMAGE] Background upload #%d error: %s", idx, s3_url)
+                    elif s3_url:
+                        logger.info("[IMAGE] Background upload #%d succeeded: %s", idx, s3_url)
             
-            # Fire and forget - don't wait for completion
-            asyncio.create_task(handle_uploads())
+            # Fire and forget - don't wait for completion, but keep a reference
+            task = asyncio.create_task(handle_uploads())
+            _BACKGROUND_TASKS.add(task)
+            task.add_done_callback(_BACKGROUND_TASKS.discard)
         
         # Return immediately with minimal info - images already visible via widget stream
         # Don't include data URLs in response to avoid exceeding max output size (1MB limit)
@@ -626,7 +753,7 @@ async def generate_image(
         }
         
     except Exception as exc:
-        print(f"[IMAGE] ERROR: {str(exc)}")
+        logger.error("[IMAGE] Image generation failed: %s", exc)
         raise RuntimeError(f"Image generation failed: {exc}") from exc
 
 
@@ -640,4 +767,7 @@ __all__ = [
     "create_prompt_tool",
     "generate_image",
     "FactAgentContext",
+    "page_title_from_url",
+    "close_shared_clients",
+    "wait_for_background_tasks",
 ]
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import logging
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from typing import Any, Literal, Sequence
@@ -26,16 +27,45 @@ DAILY_FIELDS = (
 DEFAULT_TIMEOUT = 20.0
 HOURLY_SEGMENTS = 6
 
+logger = logging.getLogger(__name__)
+
 
 class WeatherLookupError(RuntimeError):
     """Raised when the weather service could not satisfy a request."""
 
 
+_http_client: httpx.AsyncClient | None = None
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    """Return the shared client so repeated lookups reuse pooled connections."""
+
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=DEFAULT_TIMEOUT,
+            follow_redirects=True,
+            headers={"User-Agent": USER_AGENT},
+            trust_env=True,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        )
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """Close the shared HTTP client (called on application shutdown)."""
+
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
 def _debug(message: str, *, extra: dict[str, Any] | None = None) -> None:
-    payload = f"{DEBUG_PREFIX} {message}"
     if extra:
-        payload = f"{payload} | {extra}"
-    print(payload)
+        logger.debug("%s %s | %s", DEBUG_PREFIX, message, extra)
+    else:
+        logger.debug("%s %s", DEBUG_PREFIX, message)
 
 
 @dataclass(frozen=True)
@@ -75,6 +105,11 @@ def normalize_unit(value: str | None) -> Literal["celsius", "fahrenheit"]:
 
     if value is None:
         return "fahrenheit"
+    # Fast path: already canonical (e.g. the tool re-normalizing for retrieve_weather)
+    if value == "celsius":
+        return "celsius"
+    if value == "fahrenheit":
+        return "fahrenheit"
 
     normalized = value.strip().lower()
     if normalized in {"c", "cel", "celsius", "metric", "°c"}:
@@ -97,32 +132,27 @@ async def retrieve_weather(query: str, unit: str | None = None) -> WeatherWidget
     geocoded: GeocodedLocation | None = None
     forecast: dict[str, Any] | None = None
     try:
-        async with httpx.AsyncClient(
-            timeout=DEFAULT_TIMEOUT,
-            follow_redirects=True,
-            headers={"User-Agent": USER_AGENT},
-            trust_env=True,
-        ) as client:
-            geocoded = await _geocode_location(client, location_query)
-            _debug(
-                "geocode lookup succeeded",
-                extra={
-                    "label": geocoded.label,
-                    "latitude": geocoded.latitude,
-                    "longitude": geocoded.longitude,
-                },
-            )
-            _debug("requesting forecast", extra={"unit": normalized_unit})
-            forecast = await _fetch_weather_forecast(client, geocoded, normalized_unit)
-            forecast_keys = sorted(forecast.keys()) if isinstance(forecast, dict) else "unexpected"
-            has_current = bool(forecast.get("current")) if isinstance(forecast, dict) else False
-            _debug(
-                "forecast received",
-                extra={
-                    "keys": forecast_keys,
-                    "has_current": has_current,
-                },
-            )
+        client = _get_http_client()
+        geocoded = await _geocode_location(client, location_query)
+        _debug(
+            "geocode lookup succeeded",
+            extra={
+                "label": geocoded.label,
+                "latitude": geocoded.latitude,
+                "longitude": geocoded.longitude,
+            },
+        )
+        _debug("requesting forecast", extra={"unit": normalized_unit})
+        forecast = await _fetch_weather_forecast(client, geocoded, normalized_unit)
+        forecast_keys = sorted(forecast.keys()) if isinstance(forecast, dict) else "unexpected"
+        has_current = bool(forecast.get("current")) if isinstance(forecast, dict) else False
+        _debug(
+            "forecast received",
+            extra={
+                "keys": forecast_keys,
+                "has_current": has_current,
+            },
+        )
     except httpx.HTTPStatusError as exc:
         _debug(
             "http status error during weather lookup",
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""Test untuk memverifikasi kode error S3 diambil dari error boto3 yang dibungkus."""
+
+from boto3.exceptions import S3UploadFailedError
+from botocore.exceptions import ClientError
+
+from app.s3_client import _error_code
+
+
+def _client_error(code: str) -> ClientError:
+    return ClientError({"Error": {"Code": code, "Message": "test"}}, "PutObject")
+
+
+def test_error_code_from_client_error():
+    """ClientError langsung mengembalikan kode S3-nya."""
+    assert _error_code(_client_error("NoSuchBucket")) == "NoSuchBucket"
+
+
+def test_error_code_from_upload_failed_error():
+    """S3UploadFailedError dari upload_file/upload_fileobj membawa ClientError di __context__."""
+    # Mirrors boto3/s3/transfer.py: raised inside `except ClientError` without `from`
+    try:
+        try:
+            raise _client_error("AccessDenied")
+        except ClientError as e:
+            raise S3UploadFailedError(f"Failed to upload: {e}")
+    except S3UploadFailedError as error:
+        assert error.__cause__ is None
+        assert _error_code(error) == "AccessDenied"
+
+
+def test_error_code_falls_back_to_type_name():
+    """Error tanpa ClientError di belakangnya mengembalikan nama tipenya."""
+    assert _error_code(S3UploadFailedError("boom")) == "S3UploadFailedError"
+
+
+if __name__ == "__main__":
+    test_error_code_from_client_error()
+    test_error_code_from_upload_failed_error()
+    test_error_code_falls_back_to_type_name()
+    print("✅ S3 error code tests passed")